@@ -5,11 +5,10 @@ import pytesseract
 import numpy as np
 import joblib
 from tensorflow.keras.models import load_model
-from tensorflow.keras.preprocessing.image import load_img, img_to_array
-from tensorflow.keras.applications.mobilenet_v2 import preprocess_input
 from werkzeug.utils import secure_filename
 import uuid
 import platform
+from image_tiles import predict_cnn_proba
 
 app = Flask(__name__)
 
@@ -147,14 +146,12 @@ def predict_image(image_path):
         
         # CNN prediction
         if cnn_model is not None:
-            img = load_img(image_path, target_size=(224, 224))
-            img_array = img_to_array(img)
-            img_array = preprocess_input(np.expand_dims(img_array, axis=0))
-            cnn_proba = cnn_model.predict(img_array)[0]
+            cnn_proba, cnn_tiles = predict_cnn_proba(image_path, cnn_model)
             cnn_classes = len(cnn_proba)
         else:
             # Mock CNN prediction - use same number of classes as text model
             cnn_classes = text_classes
+            cnn_tiles = 0
             import random
             cnn_proba = np.array([random.uniform(0.1, 0.9) for _ in range(cnn_classes)])
             cnn_proba = cnn_proba / np.sum(cnn_proba)  # Normalize
@@ -198,7 +195,8 @@ def predict_image(image_path):
             "debug_info": {
                 "text_classes": text_classes,
                 "cnn_classes": cnn_classes,
-                "aligned_classes": num_classes
+                "aligned_classes": num_classes,
+                "cnn_tiles": cnn_tiles
             }
         }
         
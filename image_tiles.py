@@ -0,0 +1,185 @@
+"""
+Resolution-adaptive CNN input: splits large or extreme-aspect images into
+aspect-preserving tiles and classifies them in a single batched forward pass
+"""
+
+import math
+import os
+import time
+
+import numpy as np
+from PIL import Image
+
+# CNN input resolution (MobileNetV2)
+CNN_INPUT_SIZE = 224
+
+# Images whose longer side is below this are simply resized to 224x224;
+# near-square images need both sides at least this large to be tiled
+TILING_MIN_SIDE = int(os.environ.get('CNN_TILING_MIN_SIDE', 2 * CNN_INPUT_SIZE))
+# Long/short side ratio from which an image counts as extreme-aspect
+TILING_MIN_ASPECT = float(os.environ.get('CNN_TILING_MIN_ASPECT', 1.5))
+# Images with a thinner short side than this carry too little detail to tile
+TILING_MIN_SHORT_SIDE = int(os.environ.get('CNN_TILING_MIN_SHORT_SIDE', 64))
+# Hard cap on crops per image, including the global (whole image) view
+MAX_TILES = int(os.environ.get('CNN_MAX_TILES', 8))
+# Time budget for the CNN forward pass, used to derive the crop count
+LATENCY_BUDGET_MS = float(os.environ.get('CNN_LATENCY_BUDGET_MS', 400))
+# Share of the pooled log-probabilities given to the global (whole image) view
+GLOBAL_VIEW_WEIGHT = float(os.environ.get('CNN_GLOBAL_VIEW_WEIGHT', 0.5))
+
+# Running estimates of inference cost, modelled as call + extra * (crops - 1):
+# the single-crop call latency is measured directly on single-crop calls and
+# the cost of each extra crop on multi-crop batches. Single-crop calls also
+# decay the extra-crop cost toward its prior, so one slow batch cannot keep
+# tiling switched off once no multi-crop batches run to correct it
+_TILE_COST_PRIOR_MS = float(os.environ.get('CNN_TILE_COST_MS', 20))
+_call_cost_ms = float(os.environ.get('CNN_CALL_COST_MS', 60))
+_tile_cost_ms = _TILE_COST_PRIOR_MS
+_COST_SMOOTHING = 0.2
+_TILE_COST_DECAY = 0.05
+_warmed_up = False
+
+# Background used when padding elongated tiles to square (paper white)
+_PAD_COLOR = (255, 255, 255)
+
+
+def tile_budget():
+    """Number of crops the latency budget allows for one image"""
+    extra = int((LATENCY_BUDGET_MS - _call_cost_ms) // max(_tile_cost_ms, 1e-3))
+    return max(1, min(MAX_TILES, 1 + extra))
+
+
+def update_cost_estimate(crops, elapsed_ms):
+    """Fold the timing of one predict() call into the fixed/per-crop estimates"""
+    global _call_cost_ms, _tile_cost_ms
+
+    if crops == 1:
+        _call_cost_ms += _COST_SMOOTHING * (elapsed_ms - _call_cost_ms)
+        _tile_cost_ms += _TILE_COST_DECAY * (_TILE_COST_PRIOR_MS - _tile_cost_ms)
+    else:
+        sample = max(elapsed_ms - _call_cost_ms, 0.0) / (crops - 1)
+        _tile_cost_ms += _COST_SMOOTHING * (sample - _tile_cost_ms)
+
+
+def should_tile(width, height):
+    """Large or extreme-aspect images get tiled; everything else is resized"""
+    long_side, short_side = max(width, height), min(width, height)
+    if long_side < TILING_MIN_SIDE or short_side < TILING_MIN_SHORT_SIDE:
+        return False
+    return long_side / short_side >= TILING_MIN_ASPECT or short_side >= TILING_MIN_SIDE
+
+
+def _offsets(length, tile, count):
+    """Evenly spaced start positions of count tiles along one axis"""
+    if count == 1:
+        return [0]
+    return [round(i * (length - tile) / (count - 1)) for i in range(count)]
+
+
+def tile_boxes(width, height, max_tiles):
+    """
+    Crop boxes (left, top, right, bottom) covering the whole image with at
+    most max_tiles tiles.
+
+    Tiles are kept no smaller than the CNN input on either side (or the
+    image's short side, if that is smaller), so no crop gets upsampled; among
+    those grids the one with the shortest longest tile side wins, then the one
+    with fewer tiles. Once long/short exceeds the tile cap the tiles become
+    elongated; build_cnn_batch pads them to square instead of stretching,
+    which preserves aspect and coverage at the cost of spending part of each
+    224x224 input on padding.
+    """
+    min_side = min(CNN_INPUT_SIZE, width, height)
+    best = None
+    for rows in range(1, max_tiles + 1):
+        for cols in range(1, max_tiles // rows + 1):
+            tile_h = math.ceil(height / rows)
+            tile_w = math.ceil(width / cols)
+            if min(tile_h, tile_w) < min_side:
+                continue
+            key = (max(tile_h, tile_w), rows * cols)
+            if best is None or key < best[0]:
+                best = (key, rows, cols, tile_h, tile_w)
+
+    _, rows, cols, tile_h, tile_w = best
+    return [
+        (left, top, left + tile_w, top + tile_h)
+        for top in _offsets(height, tile_h, rows)
+        for left in _offsets(width, tile_w, cols)
+    ]
+
+
+def _pad_to_square(img):
+    """Centre the image on a square background so resizing keeps its aspect"""
+    width, height = img.size
+    if width == height:
+        return img
+    side = max(width, height)
+    canvas = Image.new(img.mode, (side, side), _PAD_COLOR)
+    canvas.paste(img, ((side - width) // 2, (side - height) // 2))
+    return canvas
+
+
+def build_cnn_batch(image_path):
+    """
+    Preprocessed CNN input batch for an image: a single 224x224 resize for
+    small images, otherwise the global view followed by the tile crops
+    """
+    from tensorflow.keras.preprocessing.image import load_img, img_to_array
+    from tensorflow.keras.applications.mobilenet_v2 import preprocess_input
+
+    img = load_img(image_path)
+    size = (CNN_INPUT_SIZE, CNN_INPUT_SIZE)
+
+    # Global view matches the original single-resize input (nearest, like load_img)
+    crops = [img.resize(size, Image.NEAREST)]
+
+    budget = tile_budget()
+    if budget > 1 and should_tile(*img.size):
+        for box in tile_boxes(img.size[0], img.size[1], budget - 1):
+            crops.append(_pad_to_square(img.crop(box)).resize(size, Image.NEAREST))
+
+    batch = np.stack([img_to_array(crop) for crop in crops])
+    return preprocess_input(batch)
+
+
+def pool_predictions(proba, global_weight=None):
+    """
+    Weighted average of the crops in log space, renormalised into one
+    distribution. The first row is the global view and gets global_weight of
+    the total; the tiles share the rest equally
+    """
+    if global_weight is None:
+        global_weight = GLOBAL_VIEW_WEIGHT
+    tiles = len(proba) - 1
+    if tiles == 0:
+        global_weight = 1.0
+    weights = np.array([global_weight] + [(1 - global_weight) / max(tiles, 1)] * tiles)
+
+    logits = np.log(np.clip(proba, 1e-7, 1.0))
+    pooled = np.exp(weights @ logits)
+    return pooled / np.sum(pooled)
+
+
+def predict_cnn_proba(image_path, cnn_model):
+    """
+    Class probabilities from the CNN, running all crops of the image as one
+    vectorized batch. Returns (probabilities, number of crops)
+    """
+    global _warmed_up
+
+    batch = build_cnn_batch(image_path)
+
+    start = time.perf_counter()
+    proba = cnn_model.predict(batch, batch_size=len(batch), verbose=0)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    # Keep the cost estimates current so the budget tracks the hardware;
+    # the first call pays for graph tracing and would skew them
+    if _warmed_up:
+        update_cost_estimate(len(batch), elapsed_ms)
+    _warmed_up = True
+
+    if len(batch) == 1:
+        return proba[0], 1
+    return pool_predictions(proba), len(batch)
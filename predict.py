@@ -8,10 +8,9 @@ import pytesseract
 import numpy as np
 import joblib
 from tensorflow.keras.models import load_model
-from tensorflow.keras.preprocessing.image import load_img, img_to_array
-from tensorflow.keras.applications.mobilenet_v2 import preprocess_input
 import os
 import sys
+from image_tiles import predict_cnn_proba
 
 def extract_text(image_path):
     """Extract text from image using OCR"""
@@ -44,10 +43,7 @@ def predict_image(image_path, text_model, cnn_model):
             text_proba = np.zeros(len(classes))
         
         # CNN prediction
-        img = load_img(image_path, target_size=(224, 224))
-        img_array = img_to_array(img)
-        img_array = preprocess_input(np.expand_dims(img_array, axis=0))
-        cnn_proba = cnn_model.predict(img_array, verbose=0)[0]
+        cnn_proba, cnn_tiles = predict_cnn_proba(image_path, cnn_model)
         
         # Smart weighting based on text quality
         weight_text = 0.7 if text_length > 10 else 0.3
@@ -68,6 +64,7 @@ def predict_image(image_path, text_model, cnn_model):
             "ensemble_weights": {"text": weight_text, "cnn": 1 - weight_text},
             "text_proba": text_proba.tolist(),
             "cnn_proba": cnn_proba.tolist(),
+            "cnn_tiles": cnn_tiles,
             "final_proba": final_proba.tolist()
         }
         
@@ -115,6 +112,7 @@ def main():
     print(f"🎯 Predicted Class: {result['prediction']}")
     print(f"📊 Confidence: {result['confidence']:.2%}")
     print(f"📝 Text Length: {result['text_length']} characters")
+    print(f"🧩 CNN Crops: {result['cnn_tiles']}")
     print(f"⚖️  Ensemble Weights - Text: {result['ensemble_weights']['text']:.1%}, CNN: {result['ensemble_weights']['cnn']:.1%}")
     
     print("\n📈 Detailed Probabilities:")
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Test script for the CNN tiling helpers (no TensorFlow or models required)
+"""
+
+import numpy as np
+from PIL import Image
+
+import image_tiles
+from image_tiles import _pad_to_square, pool_predictions, predict_cnn_proba, should_tile, tile_boxes
+
+# (width, height) pairs: typical, tall receipt, wide form, large square, degenerate
+SIZES = [(800, 600), (200, 4000), (4000, 300), (2000, 2000), (1, 1000), (449, 448), (1000, 1)]
+
+
+def covered(width, height, boxes):
+    mask = np.zeros((height, width), dtype=bool)
+    for left, top, right, bottom in boxes:
+        mask[top:bottom, left:right] = True
+    return mask.all()
+
+
+def test_tile_boxes_geometry():
+    """Tiles stay inside the image, cover all of it and respect the cap"""
+    for width, height in SIZES:
+        for max_tiles in (1, 2, 3, 7):
+            boxes = tile_boxes(width, height, max_tiles)
+            assert 1 <= len(boxes) <= max_tiles
+            for left, top, right, bottom in boxes:
+                assert 0 <= left < right <= width
+                assert 0 <= top < bottom <= height
+            assert covered(width, height, boxes), (width, height, max_tiles)
+
+
+def test_tile_boxes_prefers_square_tiles():
+    """A typical page is split into a grid, a tall receipt into a column"""
+    boxes = tile_boxes(800, 600, 7)
+    assert len(boxes) == 6
+    assert {(r - l, b - t) for l, t, r, b in boxes} == {(267, 300)}
+
+    boxes = tile_boxes(224, 1344, 7)
+    assert len(boxes) == 6
+    assert {(r - l, b - t) for l, t, r, b in boxes} == {(224, 224)}
+
+
+def test_tile_boxes_avoids_upsampled_tiles():
+    """Just above the tiling cutoff, two full-size tiles beat six small ones"""
+    boxes = tile_boxes(450, 300, 7)
+    assert boxes == [(0, 0, 225, 300), (225, 0, 450, 300)]
+
+
+def test_pad_to_square():
+    """Elongated crops are centred on a white square, not stretched"""
+    crop = Image.new('RGB', (100, 40), (0, 0, 0))
+    padded = np.asarray(_pad_to_square(crop))
+    assert padded.shape == (100, 100, 3)
+    assert (padded[30:70] == 0).all()
+    assert (padded[:30] == 255).all() and (padded[70:] == 255).all()
+
+    square = Image.new('RGB', (50, 50))
+    assert _pad_to_square(square) is square
+
+
+def test_should_tile():
+    """Small and thin images keep the single resize"""
+    assert not should_tile(224, 224)
+    assert not should_tile(300, 400)
+    assert not should_tile(1, 1000)
+    assert should_tile(200, 4000)
+    assert should_tile(4000, 300)
+    assert should_tile(600, 600)
+    assert not should_tile(600, 440)
+
+
+def test_should_tile_uses_configured_min_side(monkeypatch):
+    monkeypatch.setattr(image_tiles, 'TILING_MIN_SIDE', 300)
+    assert should_tile(400, 400)
+
+
+def test_pool_predictions():
+    """Pooled crops form a single probability distribution"""
+    proba = np.array([[0.7, 0.2, 0.1], [0.6, 0.3, 0.1], [0.0, 0.5, 0.5]])
+    pooled = pool_predictions(proba)
+    assert pooled.shape == (3,)
+    assert np.isclose(pooled.sum(), 1.0)
+    assert np.argmax(pooled) == 1
+
+
+def test_pool_predictions_global_weight():
+    """The global view keeps its configured share however many tiles there are"""
+    proba = np.array([[0.9, 0.1]] + [[0.2, 0.8]] * 7)
+    assert np.argmax(pool_predictions(proba, global_weight=0.5)) == 0
+    assert np.argmax(pool_predictions(proba, global_weight=1 / 8)) == 1
+    assert np.allclose(pool_predictions(proba[:1]), [0.9, 0.1])
+
+
+def reset_costs(monkeypatch, call_ms=60.0, tile_ms=20.0):
+    monkeypatch.setattr(image_tiles, 'LATENCY_BUDGET_MS', 400.0)
+    monkeypatch.setattr(image_tiles, '_call_cost_ms', call_ms)
+    monkeypatch.setattr(image_tiles, '_tile_cost_ms', tile_ms)
+    monkeypatch.setattr(image_tiles, '_TILE_COST_PRIOR_MS', 20.0)
+
+
+def test_tile_budget_recovers_after_slow_calls(monkeypatch):
+    """Slow single-crop calls switch tiling off only while they last"""
+    reset_costs(monkeypatch)
+
+    for _ in range(50):
+        image_tiles.update_cost_estimate(1, 500.0)
+    assert image_tiles.tile_budget() == 1
+
+    for _ in range(50):
+        image_tiles.update_cost_estimate(1, 80.0)
+    assert image_tiles.tile_budget() == image_tiles.MAX_TILES
+
+
+def test_tile_budget_recovers_after_multi_crop_spike(monkeypatch):
+    """One slow batch must not keep tiling off once only single crops run"""
+    # Hardware costs 60ms per call plus 120ms per crop
+    reset_costs(monkeypatch, call_ms=180.0, tile_ms=120.0)
+    assert image_tiles.tile_budget() == 2
+
+    image_tiles.update_cost_estimate(2, 300.0 + 2500.0)
+    assert image_tiles.tile_budget() == 1
+
+    calls = 0
+    while image_tiles.tile_budget() == 1:
+        image_tiles.update_cost_estimate(1, 180.0)
+        calls += 1
+        assert calls < 100
+    assert abs(image_tiles._call_cost_ms - 180.0) < 1e-6
+
+    # The probe batch re-measures the true per-crop cost
+    image_tiles.update_cost_estimate(2, 300.0)
+    assert image_tiles._tile_cost_ms > 100.0
+
+
+class StubModel:
+    """Returns a fixed probability row per crop"""
+
+    def __init__(self, rows):
+        self.rows = np.array(rows)
+        self.batch_sizes = []
+
+    def predict(self, batch, batch_size=None, verbose=0):
+        self.batch_sizes.append(len(batch))
+        return self.rows[:len(batch)]
+
+
+def test_predict_cnn_proba(monkeypatch):
+    """Single crops pass straight through, larger batches are pooled"""
+    reset_costs(monkeypatch)
+    monkeypatch.setattr(image_tiles, '_warmed_up', False)
+    model = StubModel([[0.9, 0.1], [0.2, 0.8], [0.2, 0.8]])
+
+    monkeypatch.setattr(image_tiles, 'build_cnn_batch', lambda path: np.zeros((1, 224, 224, 3)))
+    proba, crops = predict_cnn_proba('small.jpg', model)
+    assert crops == 1
+    assert np.allclose(proba, [0.9, 0.1])
+    # The warm-up call is not folded into the cost estimates
+    assert image_tiles._call_cost_ms == 60.0
+    assert image_tiles._warmed_up
+
+    monkeypatch.setattr(image_tiles, 'build_cnn_batch', lambda path: np.zeros((3, 224, 224, 3)))
+    proba, crops = predict_cnn_proba('receipt.jpg', model)
+    assert crops == 3
+    assert model.batch_sizes == [1, 3]
+    assert np.allclose(proba, pool_predictions(model.rows))
+    assert np.isclose(proba.sum(), 1.0)
+    assert image_tiles._tile_cost_ms != 20.0
+
+
+if __name__ == "__main__":
+    import pytest
+    raise SystemExit(pytest.main([__file__, "-q"]))